@@ -4,7 +4,15 @@ import os
 from fastapi import Depends, FastAPI, Header, HTTPException, Query
 from fastapi.responses import JSONResponse
 
-from webox.fetch import ExtractionError, UpstreamFetchError, fetch
+from webox.fetch import (
+    DEFAULT_MAX_CONTENT_BYTES,
+    DEFAULT_MAX_HTML_BYTES,
+    DeadlineExceeded,
+    ExtractionError,
+    PreflightRejected,
+    UpstreamFetchError,
+    fetch,
+)
 from webox.search import search_google
 
 app = FastAPI(title="webox")
@@ -28,10 +36,30 @@ def fetch_endpoint(
     timeout: float = Query(20.0, ge=1.0, le=120.0),
     raw: bool = Query(False, description="Include raw HTML"),
     raw_text: bool = Query(False, description="Include raw text extraction"),
+    max_html_bytes: int = Query(
+        DEFAULT_MAX_HTML_BYTES,
+        ge=0,
+        description="Byte budget for slimmed HTML before extraction (0 disables)",
+    ),
+    probe: bool = Query(False, description="Check content type and size before downloading"),
+    max_content_bytes: int = Query(
+        DEFAULT_MAX_CONTENT_BYTES,
+        ge=0,
+        description="Reject probed URLs larger than this many bytes (0 disables)",
+    ),
     _: None = Depends(_require_api_key),
 ):
     try:
-        return fetch(url, timeout, {}, raw, raw_text)
+        return fetch(
+            url,
+            timeout,
+            {},
+            raw,
+            raw_text,
+            max_html_bytes,
+            probe,
+            max_content_bytes,
+        )
     except UpstreamFetchError as exc:
         logger.warning(
             "webox fetch upstream_error url=%s status=%s message=%s",
@@ -50,6 +78,46 @@ def fetch_endpoint(
                 }
             },
         )
+    except PreflightRejected as exc:
+        logger.warning(
+            "webox fetch preflight_rejected url=%s kind=%s content_type=%s content_length=%s",
+            url,
+            exc.kind,
+            exc.content_type,
+            exc.content_length,
+        )
+        return JSONResponse(
+            status_code=422,
+            content={
+                "error": {
+                    "type": "preflight_rejected",
+                    "message": str(exc),
+                    "kind": exc.kind,
+                    "content_type": exc.content_type,
+                    "content_length": exc.content_length,
+                    "url": exc.url,
+                }
+            },
+        )
+    except DeadlineExceeded as exc:
+        logger.warning(
+            "webox fetch deadline_exceeded url=%s phase=%s message=%s",
+            url,
+            exc.phase,
+            str(exc),
+        )
+        return JSONResponse(
+            status_code=504,
+            content={
+                "error": {
+                    "type": "deadline_exceeded",
+                    "message": str(exc),
+                    "phase": exc.phase,
+                    "budget": timeout,
+                    "timings": exc.timings,
+                }
+            },
+        )
     except ExtractionError as exc:
         logger.warning(
             "webox fetch extraction_error url=%s kind=%s message=%s",
@@ -0,0 +1,316 @@
+import gzip
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from webox import fetch as fetch_module
+from webox.fetch import (
+    DeadlineExceeded,
+    PreflightRejected,
+    _cached_probe,
+    _content_kind,
+    _Deadline,
+    _is_unsupported_type,
+    _preflight,
+    _probe_content_length,
+    _run_with_deadline,
+    _slim_html,
+    _store_probe,
+    _strip_boilerplate,
+)
+from webox.stealth_client import StealthResponse
+
+
+@pytest.fixture(autouse=True)
+def empty_probe_cache():
+    fetch_module._probe_cache.clear()
+    yield
+    fetch_module._probe_cache.clear()
+
+
+def _probe_response(url, status_code=200, headers=None):
+    return StealthResponse(
+        status_code=status_code,
+        text="",
+        headers=headers or {},
+        url=url,
+        browser_used="chrome_win",
+        tls_fingerprint="chrome136",
+    )
+
+
+def _html_response(url, html):
+    return StealthResponse(
+        status_code=200,
+        text=html,
+        headers={"content-type": "text/html"},
+        url=url,
+        browser_used="chrome_win",
+        tls_fingerprint="chrome136",
+        content=html.encode("utf-8"),
+    )
+
+
+def test_strip_boilerplate_removes_scripts_styles_and_containers():
+    html = (
+        "<html><head><style>a{}</style><script src=x></script>"
+        '<SCRIPT>var a="</div>";</SCRIPT><!-- c --></head>'
+        "<body><nav><nav>inner</nav>menu</nav><p>Hello</p>"
+        "<svg><path/></svg><footer>f</footer><script/></body></html>"
+    )
+    assert _strip_boilerplate(html) == "<html><head></head><body><p>Hello</p></body></html>"
+
+
+def test_strip_boilerplate_keeps_custom_elements():
+    html = "<nav-bar>menu</nav-bar><main><p>IMPORTANT ARTICLE</p></main><nav>x</nav>"
+    assert _strip_boilerplate(html) == (
+        "<nav-bar>menu</nav-bar><main><p>IMPORTANT ARTICLE</p></main>"
+    )
+    html = "<script-loader></script-loader><p>kept</p><script>x</script>"
+    assert _strip_boilerplate(html) == "<script-loader></script-loader><p>kept</p>"
+
+
+def test_strip_boilerplate_leaves_unclosed_elements_in_place():
+    assert _strip_boilerplate("<p>a</p><aside><p>b</p>") == "<p>a</p><aside><p>b</p>"
+    assert _strip_boilerplate("<p>a</p><script>var x") == "<p>a</p><script>var x"
+    assert _strip_boilerplate("<p>a</p><!-- open") == "<p>a</p><!-- open"
+
+
+def test_strip_boilerplate_still_cuts_scripts_after_unclosed_container():
+    html = (
+        "<nav><a>x</a><p>body</p><script>" + "x" * 1000 + "</script>"
+        "<style>a{}</style><!-- c --><p>tail</p>"
+    )
+    assert _strip_boilerplate(html) == "<nav><a>x</a><p>body</p><p>tail</p>"
+
+
+def test_strip_boilerplate_is_linear_on_unclosed_openers():
+    html = "<aside><p>x</p>" * 8000 + "<article>body</article>"
+    started = time.monotonic()
+    assert _strip_boilerplate(html) == html
+    assert time.monotonic() - started < 1.0
+
+
+def test_slim_html_truncates_at_tag_boundary():
+    slimmed, truncated = _slim_html("<p>Hello é world</p><p>more</p>", 22)
+    assert truncated
+    assert slimmed == "<p>Hello é world</p>"
+    assert _slim_html("<p>short</p>", 25) == ("<p>short</p>", False)
+
+
+def test_slim_html_caps_input_before_scanning():
+    html = "<p>keep</p>" + "<script>" + "x" * 1000 + "</script>" + "<p>late</p>"
+    slimmed, truncated = _slim_html(html, 100)
+    assert truncated
+    assert "late" not in slimmed
+    assert slimmed.startswith("<p>keep</p>")
+
+
+def test_fetch_raw_text_uses_original_html(monkeypatch):
+    html = "<nav>Menu</nav><article><p>Body text</p></article><footer>Foot</footer>"
+    monkeypatch.setattr(
+        fetch_module, "stealth_get", lambda url, **kwargs: _html_response(url, html)
+    )
+    result = fetch_module.fetch("http://example.test/", 10.0, {}, False, True)
+    assert result["raw_text"] == "Menu\nBody text\nFoot"
+    assert result["html_size"]["slimmed_bytes"] < result["html_size"]["original_bytes"]
+    assert result["truncated"] is False
+
+
+def test_run_with_deadline_does_not_start_work_after_expiry():
+    started = []
+    deadline = _Deadline(0.0)
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        _run_with_deadline(lambda: started.append(True), deadline, "extract")
+    assert excinfo.value.phase == "extract"
+    time.sleep(0.05)
+    assert not started
+
+
+def test_run_with_deadline_stops_waiting_at_deadline():
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        _run_with_deadline(lambda: time.sleep(0.5), _Deadline(0.1), "extract")
+    assert time.monotonic() - started < 0.4
+    assert _run_with_deadline(lambda: "done", _Deadline(1.0), "extract") == "done"
+
+
+def test_run_with_deadline_reports_queue_wait_separately(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(fetch_module, "_extract_executor", executor)
+    try:
+        executor.submit(time.sleep, 0.3)
+        deadline = _Deadline(0.1)
+        with pytest.raises(DeadlineExceeded) as excinfo:
+            _run_with_deadline(lambda: "done", deadline, "extract")
+        assert excinfo.value.phase == "extract_queue"
+        assert deadline.phases["extract_queue"] >= 0.1
+        assert deadline.phases["extract"] == 0.0
+
+        deadline = _Deadline(1.0)
+        assert _run_with_deadline(lambda: "done", deadline, "extract") == "done"
+        assert set(deadline.phases) == {"extract", "extract_queue"}
+    finally:
+        executor.shutdown(wait=True)
+
+
+def test_extract_pool_size_is_configurable():
+    env = dict(os.environ, WEBOX_EXTRACT_WORKERS="7")
+    out = subprocess.run(
+        [sys.executable, "-c", "from webox import fetch; print(fetch._EXTRACT_WORKERS)"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "7"
+
+
+def test_fetch_raises_when_extraction_overruns(monkeypatch):
+    html = "<article><p>Body text</p></article>"
+    monkeypatch.setattr(
+        fetch_module, "stealth_get", lambda url, **kwargs: _html_response(url, html)
+    )
+    monkeypatch.setattr(fetch_module, "_extract_trafilatura", lambda html: time.sleep(0.5))
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        fetch_module.fetch("http://example.test/", 0.2, {}, False, False)
+    assert excinfo.value.phase == "extract"
+
+
+@pytest.mark.parametrize(
+    "content_type,url,kind",
+    [
+        ("application/pdf", "http://a.test/doc", "pdf"),
+        ("application/x-pdf", "http://a.test/a.pdf", "pdf"),
+        ("application/octet-stream", "http://a.test/a.pdf?dl=1", "pdf"),
+        ("application/gzip", "http://a.test/sitemap.xml.gz", "xml"),
+        ("application/ld+json", "http://a.test/data", "json"),
+        ("text/html", "http://a.test/", "html"),
+    ],
+)
+def test_content_kind(content_type, url, kind):
+    assert _content_kind(content_type, url) == kind
+
+
+@pytest.mark.parametrize(
+    "content_type,url,rejected",
+    [
+        ("application/download", "http://a.test/a.pdf", False),
+        ("application/octet-stream", "http://a.test/a.pdf?dl=1", False),
+        ("application/octet-stream", "http://a.test/blob", False),
+        ("application/gzip", "http://a.test/sitemap.xml.gz", False),
+        ("", "http://a.test/", False),
+        ("video/mp4", "http://a.test/clip", True),
+        ("image/png", "http://a.test/a.png", True),
+        ("application/zip", "http://a.test/a.zip", True),
+    ],
+)
+def test_is_unsupported_type(content_type, url, rejected):
+    assert _is_unsupported_type(content_type, url) is rejected
+
+
+def test_probe_content_length():
+    assert _probe_content_length({"content-range": "bytes 0-0/12345"}, 206) == 12345
+    assert _probe_content_length({"content-range": "bytes 0-0/*"}, 206) is None
+    assert _probe_content_length({"content-length": "1"}, 206) is None
+    assert _probe_content_length({"content-length": "42"}, 200) == 42
+    assert _probe_content_length({}, 200) is None
+
+
+def test_probe_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(fetch_module, "_PROBE_CACHE_SIZE", 2)
+    _store_probe("http://a.test/1", "http://a.test/1", "text/html", 1)
+    _store_probe("http://a.test/2", "http://a.test/2", "text/html", 2)
+    assert _cached_probe("http://a.test/1") is not None
+    _store_probe("http://a.test/3", "http://a.test/3", "text/html", 3)
+    assert _cached_probe("http://a.test/2") is None
+    assert _cached_probe("http://a.test/1") is not None
+    assert _cached_probe("http://a.test/3") is not None
+
+
+def test_probe_cache_expires(monkeypatch):
+    monkeypatch.setattr(fetch_module, "_PROBE_CACHE_TTL", 0.05)
+    _store_probe("http://a.test/", "http://a.test/", "text/html", 1)
+    assert _cached_probe("http://a.test/") == ("http://a.test/", "text/html", 1)
+    time.sleep(0.1)
+    assert _cached_probe("http://a.test/") is None
+    assert not fetch_module._probe_cache
+
+
+def test_preflight_rejects_and_caches(monkeypatch):
+    calls = []
+
+    def probe(url, timeout, extra_headers):
+        calls.append(url)
+        return _probe_response(
+            url, 206, {"Content-Type": "video/mp4", "Content-Range": "bytes 0-0/999"}
+        )
+
+    monkeypatch.setattr(fetch_module, "stealth_probe", probe)
+    for _ in range(2):
+        with pytest.raises(PreflightRejected) as excinfo:
+            _preflight("http://a.test/clip", _Deadline(5.0), {}, 0)
+        assert excinfo.value.kind == "unsupported_content_type"
+        assert excinfo.value.content_length == 999
+    assert calls == ["http://a.test/clip"]
+
+
+def test_preflight_rejects_oversized_bodies(monkeypatch):
+    monkeypatch.setattr(
+        fetch_module,
+        "stealth_probe",
+        lambda url, timeout, extra_headers: _probe_response(
+            url, headers={"content-type": "application/pdf", "content-length": "5000"}
+        ),
+    )
+    with pytest.raises(PreflightRejected) as excinfo:
+        _preflight("http://a.test/a.pdf", _Deadline(5.0), {}, 1000)
+    assert excinfo.value.kind == "content_too_large"
+    result = _preflight("http://a.test/a.pdf", _Deadline(5.0), {}, 10_000)
+    assert result == {"content_type": "application/pdf", "content_length": 5000, "cached": True}
+
+
+def test_fetch_does_not_download_after_probe_spends_budget(monkeypatch):
+    downloads = []
+
+    def slow_probe(url, timeout, extra_headers):
+        time.sleep(0.2)
+        return _probe_response(url, headers={"content-type": "text/html"})
+
+    monkeypatch.setattr(fetch_module, "stealth_probe", slow_probe)
+    monkeypatch.setattr(
+        fetch_module, "stealth_get", lambda url, **kwargs: downloads.append(kwargs)
+    )
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        fetch_module.fetch("http://a.test/", 0.1, {}, False, False, probe=True)
+    assert excinfo.value.phase == "probe"
+    assert not downloads
+
+
+def test_fetch_raises_when_download_leaves_nothing_to_decompress(monkeypatch):
+    body = gzip.compress(b"<urlset><url><loc>http://a.test/</loc></url></urlset>")
+
+    def slow_get(url, **kwargs):
+        time.sleep(kwargs["timeout"] + 0.05)
+        return StealthResponse(
+            status_code=200,
+            text="",
+            headers={"content-type": "application/gzip"},
+            url=url,
+            browser_used="chrome_win",
+            tls_fingerprint="chrome136",
+            content=body,
+        )
+
+    monkeypatch.setattr(fetch_module, "stealth_get", slow_get)
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        fetch_module.fetch("http://a.test/sitemap.xml.gz", 0.1, {}, False, False)
+    assert excinfo.value.phase == "decompress"
+    timings = excinfo.value.timings
+    assert timings["budget_s"] == 0.1
+    assert set(timings["phases_s"]) == {"download", "decompress"}
+    assert timings["phases_s"]["download"] >= 0.1
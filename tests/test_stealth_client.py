@@ -0,0 +1,284 @@
+import http.server
+import random
+import socket
+import threading
+import time
+
+import pytest
+
+from webox import stealth_client
+from webox.stealth_client import BrowserType, ProxyPool, stealth_get, stealth_probe
+
+
+class _StandInProxy(http.server.ThreadingHTTPServer):
+    """Answers proxied requests itself instead of forwarding them."""
+
+    daemon_threads = True
+
+    def __init__(self, status=200, body_delay=0.0, header_delay=0.0):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.status = status
+        self.body_delay = body_delay
+        self.header_delay = header_delay
+        self.seen = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.seen.append((self.path, self.client_address[1]))
+        body = f"via {self.server.url}".encode("utf-8")
+        if self.server.header_delay:
+            time.sleep(self.server.header_delay)
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=abc; Path=/")
+        self.end_headers()
+        self.wfile.flush()
+        if self.server.body_delay:
+            time.sleep(self.server.body_delay)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _RangeOnlyOrigin(http.server.BaseHTTPRequestHandler):
+    """Origin that refuses HEAD and only answers ranged GETs."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        assert self.headers["Range"] == "bytes=0-0"
+        self.send_response(206)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Range", "bytes 0-0/12345")
+        self.send_header("Content-Length", "1")
+        self.end_headers()
+        self.wfile.write(b"%")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(**kwargs):
+        server = _StandInProxy(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fixed_browser(monkeypatch):
+    # Sessions are pooled per TLS fingerprint, so pin it to make reuse visible.
+    monkeypatch.setattr(
+        stealth_client,
+        "_select_browser",
+        lambda: (BrowserType.CHROME_WIN, stealth_client.USER_AGENTS[BrowserType.CHROME_WIN][0]),
+    )
+
+
+def _dead_proxy_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_stealth_get_reports_egress_without_credentials(stand_in):
+    proxy = stand_in()
+    pool = ProxyPool([proxy.url.replace("http://", "http://user:secret@")])
+    try:
+        resp = stealth_get("http://origin.test/page", timeout=5, proxy_pool=pool)
+    finally:
+        pool.close()
+    assert resp.status_code == 200
+    assert resp.text == f"via {proxy.url}"
+    assert resp.egress == proxy.url
+    assert proxy.seen[0][0] == "http://origin.test/page"
+
+
+def test_sessions_are_reused_and_cookies_cleared(stand_in):
+    proxy = stand_in()
+    pool = ProxyPool([proxy.url])
+    try:
+        for _ in range(3):
+            stealth_get("http://origin.test/", timeout=5, proxy_pool=pool)
+        (state,) = pool._states
+        (idle,) = state.idle_sessions.values()
+        assert len(idle) == 1
+        assert len(idle[0].cookies) == 0
+    finally:
+        pool.close()
+    assert len({port for _, port in proxy.seen}) == 1
+
+
+def test_origin_errors_do_not_bench_proxy(stand_in):
+    proxy = stand_in(status=503)
+    pool = ProxyPool([proxy.url], min_samples=1)
+    try:
+        for status in (503, 403, 429):
+            proxy.status = status
+            resp = stealth_get("http://origin.test/", timeout=5, proxy_pool=pool)
+            assert resp.status_code == status
+        (state,) = pool._states
+        assert state.benched_until == 0.0
+        assert state.error_rate() == 0.0
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("status", [407, 502])
+def test_proxy_level_statuses_bench_proxy(stand_in, status):
+    proxy = stand_in(status=status)
+    pool = ProxyPool([proxy.url], min_samples=1)
+    try:
+        stealth_get("http://origin.test/", timeout=5, proxy_pool=pool)
+        (state,) = pool._states
+        assert state.benched_until > time.monotonic()
+    finally:
+        pool.close()
+
+
+def test_connection_failure_benches_proxy():
+    pool = ProxyPool([_dead_proxy_url()], min_samples=1)
+    with pytest.raises(Exception):
+        stealth_get("http://origin.test/", timeout=5, proxy_pool=pool)
+    (state,) = pool._states
+    assert state.benched_until > time.monotonic()
+
+
+def test_slow_origin_does_not_bench_proxy(stand_in):
+    proxy = stand_in(header_delay=0.5)
+    pool = ProxyPool([proxy.url], min_samples=1)
+    try:
+        for _ in range(3):
+            with pytest.raises(Exception) as excinfo:
+                stealth_get("http://origin.test/", timeout=0.2, proxy_pool=pool)
+            assert "timed out" in str(excinfo.value).lower()
+        (state,) = pool._states
+        assert state.benched_until == 0.0
+        assert not state.outcomes
+    finally:
+        pool.close()
+
+
+def test_latency_is_time_to_first_byte(stand_in):
+    proxy = stand_in(body_delay=0.5)
+    pool = ProxyPool([proxy.url])
+    try:
+        stealth_get("http://origin.test/", timeout=5, proxy_pool=pool)
+        (state,) = pool._states
+        assert state.latency() is not None
+        assert state.latency() < 0.4
+    finally:
+        pool.close()
+
+
+def test_bench_uses_windowed_error_rate():
+    pool = ProxyPool(["http://127.0.0.1:1"])
+    (state,) = pool._states
+    for _ in range(20):
+        pool.record(state, ok=True, latency=0.1)
+    pool.record(state, ok=False)
+    pool.record(state, ok=False)
+    assert state.benched_until == 0.0
+    for _ in range(8):
+        pool.record(state, ok=False)
+    assert state.benched_until > time.monotonic()
+    assert not state.outcomes
+
+
+def test_slow_proxy_is_benched_on_median_latency():
+    pool = ProxyPool(["http://127.0.0.1:1"], min_samples=3, latency_threshold=2.0)
+    (state,) = pool._states
+    pool.record(state, ok=True, latency=0.1)
+    pool.record(state, ok=True, latency=30.0)
+    pool.record(state, ok=True, latency=0.2)
+    assert state.benched_until == 0.0
+    pool.record(state, ok=True, latency=5.0)
+    pool.record(state, ok=True, latency=6.0)
+    assert state.benched_until > time.monotonic()
+
+
+def test_benched_proxy_is_skipped_then_recovers():
+    pool = ProxyPool(
+        ["http://127.0.0.1:1", "http://127.0.0.1:2"],
+        sticky=True,
+        min_samples=1,
+        bench_seconds=0.1,
+    )
+    first = pool.choose("example.com")
+    assert pool.choose("example.com") is first
+    pool.record(first, ok=False)
+    other = pool.choose("example.com")
+    assert other is not first
+    assert pool.choose("example.com") is other
+    time.sleep(0.15)
+    assert pool.choose("example.com") is first
+
+
+def test_sticky_routing_spreads_hosts():
+    pool = ProxyPool([f"http://127.0.0.1:{port}" for port in (1, 2, 3)], sticky=True)
+    chosen = {pool.choose(f"host{i}.test").url for i in range(50)}
+    assert len(chosen) == 3
+
+
+def test_choose_prefers_better_scores():
+    pool = ProxyPool(["http://127.0.0.1:1", "http://127.0.0.1:2"])
+    good, bad = pool._states
+    for _ in range(5):
+        pool.record(good, ok=True, latency=0.1)
+        pool.record(bad, ok=True, latency=2.0)
+    assert good.score() > bad.score()
+    random.seed(0)
+    picks = [pool.choose("example.com") for _ in range(1000)]
+    assert picks.count(good) > 900
+
+
+def test_probe_falls_back_to_ranged_get():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeOnlyOrigin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        resp = stealth_probe(f"http://127.0.0.1:{server.server_address[1]}/a.pdf", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    headers = {k.lower(): v for k, v in resp.headers.items()}
+    assert resp.status_code == 206
+    assert headers["content-type"] == "application/pdf"
+    assert headers["content-range"] == "bytes 0-0/12345"
+    assert resp.content == b""
+
+
+def test_probe_does_not_affect_proxy_health(stand_in):
+    proxy = stand_in(status=407)
+    pool = ProxyPool([proxy.url], min_samples=1)
+    try:
+        resp = stealth_probe("http://origin.test/", timeout=5, proxy_pool=pool)
+        assert resp.status_code == 407
+        (state,) = pool._states
+        assert state.benched_until == 0.0
+        assert not state.outcomes
+    finally:
+        pool.close()
@@ -3,13 +3,22 @@ import argparse
 import json
 import sys
 
-from webox.fetch import fetch
+from webox.fetch import DEFAULT_MAX_CONTENT_BYTES, DEFAULT_MAX_HTML_BYTES, fetch
 from webox.search import search_google
 
 
 def _fetch_cmd(args: argparse.Namespace) -> int:
     try:
-        payload = fetch(args.url, args.timeout, {}, args.raw, args.raw_text)
+        payload = fetch(
+            args.url,
+            args.timeout,
+            {},
+            args.raw,
+            args.raw_text,
+            args.max_html_bytes,
+            args.probe,
+            args.max_content_bytes,
+        )
     except Exception as exc:
         print(json.dumps({"error": str(exc), "url": args.url}), file=sys.stderr)
         return 1
@@ -44,6 +53,23 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Include raw text extraction in output (disabled by default).",
     )
+    fetch_parser.add_argument(
+        "--max-html-bytes",
+        type=int,
+        default=DEFAULT_MAX_HTML_BYTES,
+        help="Byte budget for slimmed HTML before extraction (0 disables).",
+    )
+    fetch_parser.add_argument(
+        "--probe",
+        action="store_true",
+        help="Check content type and size before downloading (disabled by default).",
+    )
+    fetch_parser.add_argument(
+        "--max-content-bytes",
+        type=int,
+        default=DEFAULT_MAX_CONTENT_BYTES,
+        help="Reject probed URLs larger than this many bytes (0 disables).",
+    )
     fetch_parser.set_defaults(func=_fetch_cmd)
 
     search_parser = sub.add_parser("search", help="Search via Custom Search API")
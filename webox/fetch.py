@@ -1,10 +1,19 @@
-import gzip
+import contextlib
 import html.parser
 import io
 import logging
-from typing import Dict, Optional
+import os
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
-from webox.stealth_client import stealth_get
+from webox.stealth_client import MIN_REQUEST_TIMEOUT, stealth_get, stealth_probe
 
 try:
     import trafilatura
@@ -23,6 +32,72 @@ except Exception as exc:  # pragma: no cover
 
 logger = logging.getLogger("webox.fetch")
 
+DEFAULT_MAX_HTML_BYTES = 2_000_000
+
+# The prefilter only looks at this many times the byte budget of raw HTML,
+# so a huge page never reaches the scanner whole.
+_SLIM_INPUT_FACTOR = 4
+
+# Raw-text elements end at the first matching close tag; containers nest.
+_SLIM_RAW_TEXT_TAGS = {"script", "style", "iframe", "noscript"}
+_SLIM_CONTAINER_TAGS = {"svg", "template", "nav", "footer", "aside"}
+_SLIM_TAGS = _SLIM_RAW_TEXT_TAGS | _SLIM_CONTAINER_TAGS
+# The lookahead keeps custom elements such as <nav-bar> from matching <nav>,
+# and [^<>]* bounds each attempt at the next tag so scanning stays linear.
+_SLIM_TAG_RE = re.compile(r"<!--|<(/?)([a-zA-Z][a-zA-Z0-9:-]*)(?=[\s/>])[^<>]*>")
+_SLIM_CLOSE_RE = {
+    tag: re.compile(rf"</{tag}\s*>", re.IGNORECASE) for tag in _SLIM_RAW_TEXT_TAGS
+}
+
+_GUNZIP_CHUNK = 64 * 1024
+
+# Extraction runs on a small fixed pool so work abandoned at a deadline can
+# never occupy more than this many threads; later jobs queue behind it.
+# Set WEBOX_EXTRACT_WORKERS to size it for the host.
+_EXTRACT_WORKERS = max(1, int(os.environ.get("WEBOX_EXTRACT_WORKERS", "4")))
+_extract_executor = ThreadPoolExecutor(
+    max_workers=_EXTRACT_WORKERS, thread_name_prefix="webox-extract"
+)
+
+DEFAULT_MAX_CONTENT_BYTES = 25_000_000
+
+_XML_CONTENT_TYPES = {
+    "text/xml",
+    "application/xml",
+    "application/rss+xml",
+    "application/atom+xml",
+    "application/sitemap+xml",
+}
+_JSON_CONTENT_TYPES = {"application/json", "text/json"}
+# The probe only rejects types that are clearly media or archives; anything
+# else goes on to fetch(), which falls back to HTML extraction.
+_MEDIA_TYPE_PREFIXES = ("image/", "video/", "audio/", "font/")
+_ARCHIVE_CONTENT_TYPES = {
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-tar",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/java-archive",
+    "application/vnd.android.package-archive",
+    "application/x-msdownload",
+    "application/x-apple-diskimage",
+    "application/x-iso9660-image",
+}
+
+_PROBE_TIMEOUT = 5.0
+_PROBE_CACHE_TTL = 600.0
+_PROBE_CACHE_SIZE = 1024
+_probe_cache: "OrderedDict[str, Tuple[float, str, str, Optional[int]]]" = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+T = TypeVar("T")
+
 
 class UpstreamFetchError(RuntimeError):
     def __init__(self, status_code: int, url: str, message: str) -> None:
@@ -37,6 +112,104 @@ class ExtractionError(RuntimeError):
         self.kind = kind
 
 
+class PreflightRejected(RuntimeError):
+    def __init__(
+        self,
+        kind: str,
+        url: str,
+        content_type: str,
+        content_length: Optional[int],
+        message: str,
+    ) -> None:
+        super().__init__(message)
+        self.kind = kind
+        self.url = url
+        self.content_type = content_type
+        self.content_length = content_length
+
+
+class DeadlineExceeded(RuntimeError):
+    def __init__(self, phase: str, message: str) -> None:
+        super().__init__(message)
+        self.phase = phase
+        self.timings: Optional[Dict[str, object]] = None
+
+
+class _Deadline:
+    """Single request budget shared by download, decompression and extraction."""
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self._started = time.monotonic()
+        self._expires_at = self._started + budget
+        self.phases: Dict[str, float] = {}
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    def timeout_for(self, phase: str) -> float:
+        remaining = self.remaining()
+        if remaining < MIN_REQUEST_TIMEOUT:
+            raise DeadlineExceeded(
+                phase, f"Deadline of {self.budget}s exceeded before {phase}"
+            )
+        return remaining
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "budget_s": self.budget,
+            "elapsed_s": round(time.monotonic() - self._started, 3),
+            "phases_s": {name: round(spent, 3) for name, spent in self.phases.items()},
+        }
+
+
+def _run_with_deadline(func: Callable[[], T], deadline: _Deadline, phase: str) -> T:
+    # trafilatura and pypdf cannot be interrupted, so they run on the
+    # extraction pool and the caller stops waiting once the budget is spent.
+    # Time spent waiting for a worker is reported as "<phase>_queue".
+    if deadline.expired():
+        raise DeadlineExceeded(phase, f"Deadline of {deadline.budget}s exceeded before {phase}")
+    queued_at = time.monotonic()
+    started: List[float] = []
+
+    def job() -> T:
+        started.append(time.monotonic())
+        return func()
+
+    future = _extract_executor.submit(job)
+    try:
+        return future.result(timeout=deadline.remaining())
+    except FutureTimeoutError as exc:
+        if future.cancel():
+            # Never left the queue, so the pool was busy with other work.
+            raise DeadlineExceeded(
+                f"{phase}_queue",
+                f"Deadline of {deadline.budget}s exceeded while queued for {phase}",
+            ) from exc
+        raise DeadlineExceeded(
+            phase, f"Deadline of {deadline.budget}s exceeded during {phase}"
+        ) from exc
+    finally:
+        now = time.monotonic()
+        began = started[0] if started else now
+        deadline.add(f"{phase}_queue", began - queued_at)
+        deadline.add(phase, now - began)
+
+
 class _TextExtractor(html.parser.HTMLParser):
     def __init__(self) -> None:
         super().__init__()
@@ -57,6 +230,103 @@ def _to_text(html: str) -> str:
     return parser.get_text()
 
 
+def _truncate_at_tag(text: str, max_bytes: int) -> Tuple[str, bool]:
+    # Every character is at least one UTF-8 byte, so only the first
+    # max_bytes characters can ever be kept and only those get encoded.
+    encoded = text[:max_bytes].encode("utf-8", errors="replace")
+    if len(text) <= max_bytes and len(encoded) <= max_bytes:
+        return text, False
+    head = encoded[:max_bytes].decode("utf-8", errors="ignore")
+    # Cut after the last complete tag so the parser never sees half a tag.
+    boundary = head.rfind(">")
+    if boundary != -1:
+        head = head[: boundary + 1]
+    return head, True
+
+
+def _strip_boilerplate(html: str) -> str:
+    # One forward scan over the tags. Comments and raw-text elements jump
+    # straight to their terminator; containers count nesting of their own
+    # tag. Anything that never closes is left in place rather than eating
+    # the rest of the document; for an unclosed container the comments and
+    # raw-text elements seen inside it are still cut.
+    out = []
+    pos = 0
+    cursor = 0
+    skip_tag = None
+    skip_depth = 0
+    skip_start = 0
+    skip_cuts: List[Tuple[int, int]] = []
+    while True:
+        m = _SLIM_TAG_RE.search(html, cursor)
+        if m is None:
+            break
+        if m.group(0) == "<!--":
+            end = html.find("-->", m.end())
+            if end == -1:
+                break
+            if skip_tag is None:
+                out.append(html[pos : m.start()])
+                pos = end + 3
+            else:
+                skip_cuts.append((m.start(), end + 3))
+            cursor = end + 3
+            continue
+        closing = bool(m.group(1))
+        name = m.group(2).lower()
+        self_closing = m.group(0).endswith("/>")
+        if skip_tag is not None:
+            if name == skip_tag:
+                if closing:
+                    skip_depth -= 1
+                elif not self_closing:
+                    skip_depth += 1
+                if skip_depth == 0:
+                    skip_tag = None
+                    pos = m.end()
+            elif name in _SLIM_RAW_TEXT_TAGS and not closing and not self_closing:
+                close = _SLIM_CLOSE_RE[name].search(html, m.end())
+                if close is None:
+                    break
+                skip_cuts.append((m.start(), close.end()))
+                cursor = close.end()
+                continue
+            cursor = m.end()
+            continue
+        if closing or name not in _SLIM_TAGS:
+            cursor = m.end()
+            continue
+        out.append(html[pos : m.start()])
+        if self_closing:
+            pos = cursor = m.end()
+            continue
+        if name in _SLIM_RAW_TEXT_TAGS:
+            close = _SLIM_CLOSE_RE[name].search(html, m.end())
+            if close is None:
+                pos = m.start()
+                break
+            pos = cursor = close.end()
+            continue
+        skip_tag, skip_depth, skip_start = name, 1, m.start()
+        skip_cuts = []
+        cursor = m.end()
+    if skip_tag is not None:
+        pos = skip_start
+        for start, end in skip_cuts:
+            out.append(html[pos:start])
+            pos = end
+    out.append(html[pos:])
+    return "".join(out)
+
+
+def _slim_html(html: str, max_bytes: Optional[int]) -> Tuple[str, bool]:
+    if not max_bytes:
+        return _strip_boilerplate(html), False
+    capped, input_truncated = _truncate_at_tag(html, max_bytes * _SLIM_INPUT_FACTOR)
+    slimmed, output_truncated = _truncate_at_tag(_strip_boilerplate(capped), max_bytes)
+    return slimmed, input_truncated or output_truncated
+
+
 def _extract_trafilatura(html: str) -> Optional[str]:
     return trafilatura.extract(
         html,
@@ -67,44 +337,197 @@ def _extract_trafilatura(html: str) -> Optional[str]:
     )
 
 
-def _extract_pdf_text(content_bytes: bytes) -> str:
+def _extract_pdf_text(content_bytes: bytes, deadline: _Deadline, chunks: List[str]) -> bool:
+    # Pages are appended to ``chunks`` as they are extracted so the caller
+    # can keep what was done if the deadline cuts the worker off.
     if not content_bytes:
-        return ""
+        return False
     reader = PdfReader(io.BytesIO(content_bytes))
-    chunks = []
     for page in reader.pages:
+        if deadline.expired():
+            return True
         text = page.extract_text() or ""
         if text:
             chunks.append(text)
-    return "\n\n".join(chunks).strip()
+    return False
 
 
-def fetch(
+def _gunzip(content_bytes: bytes, deadline: _Deadline) -> Tuple[bytes, bool]:
+    out = []
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = content_bytes
+    pos = 0
+    while pos < len(data):
+        if deadline.expired():
+            return b"".join(out), True
+        out.append(decomp.decompress(data[pos : pos + _GUNZIP_CHUNK]))
+        pos += _GUNZIP_CHUNK
+        if decomp.eof:
+            # Concatenated gzip members, as gzip.decompress accepts.
+            data = decomp.unused_data + data[pos:]
+            pos = 0
+            if data.startswith(b"\x1f\x8b"):
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                break
+    if not decomp.eof:
+        raise zlib.error("incomplete or truncated gzip stream")
+    out.append(decomp.flush())
+    return b"".join(out), False
+
+
+def _url_has_suffix(url: str, suffixes: Tuple[str, ...]) -> bool:
+    url_lower = url.lower()
+    return url_lower.endswith(suffixes) or urllib.parse.urlsplit(url_lower).path.endswith(
+        suffixes
+    )
+
+
+def _content_kind(content_type: str, url: str) -> str:
+    # Shared by fetch() and the probe so both agree on what a URL is.
+    if content_type == "application/pdf" or _url_has_suffix(url, (".pdf",)):
+        return "pdf"
+    if content_type in _XML_CONTENT_TYPES or _url_has_suffix(url, (".xml", ".xml.gz")):
+        return "xml"
+    if (
+        content_type in _JSON_CONTENT_TYPES
+        or content_type.endswith("+json")
+        or _url_has_suffix(url, (".json",))
+    ):
+        return "json"
+    return "html"
+
+
+def _is_unsupported_type(content_type: str, url: str) -> bool:
+    if _content_kind(content_type, url) != "html":
+        return False
+    return content_type.startswith(_MEDIA_TYPE_PREFIXES) or content_type in _ARCHIVE_CONTENT_TYPES
+
+
+def _probe_content_length(headers: Dict[str, str], status_code: int) -> Optional[int]:
+    # For a 206 the body length is the one-byte range; the full size is in
+    # Content-Range ("bytes 0-0/12345", or "*" when unknown).
+    if status_code == 206:
+        total = headers.get("content-range", "").rpartition("/")[2].strip()
+        return int(total) if total.isdigit() else None
+    length = headers.get("content-length", "").strip()
+    return int(length) if length.isdigit() else None
+
+
+def _cached_probe(url: str) -> Optional[Tuple[str, str, Optional[int]]]:
+    with _probe_cache_lock:
+        entry = _probe_cache.get(url)
+        if entry is None:
+            return None
+        expires_at, final_url, content_type, content_length = entry
+        if expires_at <= time.monotonic():
+            del _probe_cache[url]
+            return None
+        _probe_cache.move_to_end(url)
+        return final_url, content_type, content_length
+
+
+def _store_probe(
+    url: str, final_url: str, content_type: str, content_length: Optional[int]
+) -> None:
+    with _probe_cache_lock:
+        _probe_cache[url] = (
+            time.monotonic() + _PROBE_CACHE_TTL,
+            final_url,
+            content_type,
+            content_length,
+        )
+        _probe_cache.move_to_end(url)
+        while len(_probe_cache) > _PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+
+
+def _preflight(
     url: str,
-    timeout: float,
-    headers: Dict[str, str],
+    deadline: _Deadline,
+    extra_headers: Dict[str, str],
+    max_content_bytes: Optional[int],
+) -> Optional[Dict[str, object]]:
+    cached = _cached_probe(url)
+    if cached is not None:
+        probe_url, content_type, content_length = cached
+    else:
+        probe_timeout = min(_PROBE_TIMEOUT, deadline.timeout_for("probe"))
+        try:
+            resp = stealth_probe(
+                url, timeout=probe_timeout, extra_headers=extra_headers or None
+            )
+        except Exception as exc:
+            if deadline.expired():
+                raise DeadlineExceeded(
+                    "probe", f"Deadline exceeded while probing {url}"
+                ) from exc
+            # The probe is an optimisation; fall back to a normal fetch.
+            logger.warning("webox fetch probe_failed url=%s error=%s", url, str(exc))
+            return None
+        if resp.status_code >= 400:
+            # Leave upstream errors to the real fetch, which reports them.
+            return None
+        headers = {k.lower(): v for k, v in resp.headers.items()}
+        content_type = (headers.get("content-type") or "").split(";")[0].strip().lower()
+        content_length = _probe_content_length(headers, resp.status_code)
+        probe_url = str(resp.url)
+        _store_probe(url, probe_url, content_type, content_length)
+    if _is_unsupported_type(content_type, probe_url):
+        raise PreflightRejected(
+            "unsupported_content_type",
+            url,
+            content_type,
+            content_length,
+            f"Unsupported content type {content_type} at {url}",
+        )
+    if max_content_bytes and content_length is not None and content_length > max_content_bytes:
+        raise PreflightRejected(
+            "content_too_large",
+            url,
+            content_type,
+            content_length,
+            f"Content length {content_length} exceeds budget of {max_content_bytes} bytes at {url}",
+        )
+    return {
+        "content_type": content_type,
+        "content_length": content_length,
+        "cached": cached is not None,
+    }
+
+
+def _fetch_within_deadline(
+    url: str,
+    deadline: _Deadline,
+    extra_headers: Dict[str, str],
     include_raw: bool,
     include_raw_text: bool,
+    max_html_bytes: Optional[int],
+    probe: bool,
+    max_content_bytes: Optional[int],
 ) -> Dict[str, object]:
-    # Avoid overriding stealth client UA and browser fingerprint headers.
-    blocked = {
-        "User-Agent",
-        "Accept",
-        "Accept-Language",
-        "Accept-Encoding",
-        "DNT",
-        "Connection",
-        "Upgrade-Insecure-Requests",
-        "Sec-Fetch-Dest",
-        "Sec-Fetch-Mode",
-        "Sec-Fetch-Site",
-        "Sec-Fetch-User",
-        "sec-ch-ua",
-        "sec-ch-ua-mobile",
-        "sec-ch-ua-platform",
-    }
-    extra_headers = {k: v for k, v in headers.items() if k not in blocked}
-    resp = stealth_get(url, timeout=timeout, extra_headers=extra_headers or None)
+    timeout = deadline.budget
+    preflight = None
+    if probe:
+        with deadline.phase("probe"):
+            preflight = _preflight(url, deadline, extra_headers, max_content_bytes)
+        if deadline.expired():
+            raise DeadlineExceeded(
+                "probe", f"Deadline of {timeout}s exceeded while probing {url}"
+            )
+    with deadline.phase("download"):
+        try:
+            resp = stealth_get(
+                url,
+                timeout=deadline.timeout_for("download"),
+                extra_headers=extra_headers or None,
+            )
+        except Exception as exc:
+            if deadline.expired():
+                raise DeadlineExceeded(
+                    "download", f"Deadline of {timeout}s exceeded while downloading {url}"
+                ) from exc
+            raise
     redirect_chain = list(resp.redirect_chain or [])
     redirect_statuses = list(resp.redirect_statuses or [])
     if resp.status_code >= 400:
@@ -125,29 +548,33 @@ def fetch(
         (resp.headers.get("content-type") or "").split(";")[0].strip().lower()
     )
     url_lower = str(resp.url).lower()
-    is_pdf = content_type == "application/pdf" or url_lower.endswith(".pdf")
-    is_xml = content_type in {
-        "text/xml",
-        "application/xml",
-        "application/rss+xml",
-        "application/atom+xml",
-        "application/sitemap+xml",
-    } or url_lower.endswith((".xml", ".xml.gz"))
-    is_json = (
-        content_type in {"application/json", "text/json"}
-        or content_type.endswith("+json")
-        or url_lower.endswith(".json")
-    )
+    kind = _content_kind(content_type, str(resp.url))
+    is_pdf = kind == "pdf"
+    is_xml = kind == "xml"
+    is_json = kind == "json"
     content_encoding = (resp.headers.get("content-encoding") or "").lower()
     has_gzip_magic = resp.content[:2] == b"\x1f\x8b"
     looks_gzip = has_gzip_magic
     html = resp.text or ""
+    html_size = None
+    truncated = False
     if not is_xml and html:
         xml_prefix = html.lstrip()[:200].lower()
         if xml_prefix.startswith(("<?xml", "<rss", "<feed", "<urlset", "<sitemapindex")):
             is_xml = True
     if is_pdf:
-        extracted = _extract_pdf_text(resp.content)
+        pages: List[str] = []
+        try:
+            truncated = _run_with_deadline(
+                lambda: _extract_pdf_text(resp.content, deadline, pages),
+                deadline,
+                "extract",
+            )
+        except DeadlineExceeded:
+            if not pages:
+                raise
+            truncated = True
+        extracted = "\n\n".join(list(pages)).strip()
         if resp.content and not extracted:
             logger.warning(
                 "webox fetch pdf_extraction_empty url=%s final_url=%s status=%s redirects=%s redirect_statuses=%s content_type=%s",
@@ -183,7 +610,8 @@ def fetch(
             )
         if looks_gzip and content_bytes:
             try:
-                content_bytes = gzip.decompress(content_bytes)
+                with deadline.phase("decompress"):
+                    content_bytes, truncated = _gunzip(content_bytes, deadline)
             except Exception as exc:
                 logger.warning(
                     "webox fetch gzip_decompress_failed url=%s final_url=%s status=%s redirects=%s redirect_statuses=%s content_type=%s error=%s",
@@ -196,6 +624,11 @@ def fetch(
                     str(exc),
                 )
                 raise ExtractionError("gzip_decompress_failed", "Failed to decompress gzip content") from exc
+            if truncated and not content_bytes:
+                raise DeadlineExceeded(
+                    "decompress",
+                    f"Deadline of {timeout}s exceeded before any content was decompressed",
+                )
         xml_text = ""
         if content_bytes:
             xml_text = content_bytes.decode("utf-8", errors="replace")
@@ -208,7 +641,31 @@ def fetch(
         raw_text = json_text if include_raw_text else ""
         html = ""
     else:
-        extracted = _extract_trafilatura(html) if html else None
+        def slim_and_extract() -> Tuple[str, bool, Optional[str]]:
+            slimmed, cut = _slim_html(html, max_html_bytes)
+            return slimmed, cut, (_extract_trafilatura(slimmed) if slimmed else None)
+
+        try:
+            slimmed, html_truncated, extracted = (
+                _run_with_deadline(slim_and_extract, deadline, "extract")
+                if html
+                else ("", False, None)
+            )
+        except DeadlineExceeded:
+            logger.warning(
+                "webox fetch html_extraction_deadline url=%s final_url=%s budget=%s html_len=%s",
+                url,
+                resp.url,
+                timeout,
+                len(html),
+            )
+            raise
+        html_size = {
+            "original_bytes": len(html.encode("utf-8", errors="replace")),
+            "slimmed_bytes": len(slimmed.encode("utf-8", errors="replace")),
+            "truncated": html_truncated,
+        }
+        truncated = html_truncated
         if html and extracted is None:
             logger.warning(
                 "webox fetch html_extraction_failed url=%s final_url=%s status=%s redirects=%s redirect_statuses=%s content_type=%s html_len=%s",
@@ -221,7 +678,13 @@ def fetch(
                 len(html),
             )
             extracted = ""
-        raw_text = _to_text(html) if (include_raw_text and html) else ""
+        raw_text = ""
+        if include_raw_text and html:
+            try:
+                raw_text = _run_with_deadline(lambda: _to_text(html), deadline, "raw_text")
+            except DeadlineExceeded:
+                # The extracted content is complete; only raw_text is lost.
+                truncated = True
     return {
         "final_url": str(resp.url),
         "status_code": resp.status_code,
@@ -231,8 +694,59 @@ def fetch(
         "content": extracted or "",
         "raw_text": raw_text,
         "html": html if include_raw else "",
+        "html_size": html_size,
+        "truncated": truncated,
+        "preflight": preflight,
+        "timings": deadline.report(),
         "stealth": {
             "browser_used": resp.browser_used,
             "tls_fingerprint": resp.tls_fingerprint,
+            "egress": resp.egress,
         },
     }
+
+
+def fetch(
+    url: str,
+    timeout: float,
+    headers: Dict[str, str],
+    include_raw: bool,
+    include_raw_text: bool,
+    max_html_bytes: Optional[int] = DEFAULT_MAX_HTML_BYTES,
+    probe: bool = False,
+    max_content_bytes: Optional[int] = DEFAULT_MAX_CONTENT_BYTES,
+) -> Dict[str, object]:
+    # Avoid overriding stealth client UA and browser fingerprint headers.
+    blocked = {
+        "User-Agent",
+        "Accept",
+        "Accept-Language",
+        "Accept-Encoding",
+        "DNT",
+        "Connection",
+        "Upgrade-Insecure-Requests",
+        "Sec-Fetch-Dest",
+        "Sec-Fetch-Mode",
+        "Sec-Fetch-Site",
+        "Sec-Fetch-User",
+        "sec-ch-ua",
+        "sec-ch-ua-mobile",
+        "sec-ch-ua-platform",
+    }
+    extra_headers = {k: v for k, v in headers.items() if k not in blocked}
+    deadline = _Deadline(timeout)
+    try:
+        return _fetch_within_deadline(
+            url,
+            deadline,
+            extra_headers,
+            include_raw,
+            include_raw_text,
+            max_html_bytes,
+            probe,
+            max_content_bytes,
+        )
+    except DeadlineExceeded as exc:
+        # Reported after every phase has closed so the breakdown is complete.
+        exc.timings = deadline.report()
+        raise
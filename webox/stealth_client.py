@@ -3,15 +3,27 @@ High-stealth HTTP client utilities.
 
 Always uses TLS fingerprint impersonation via curl_cffi and realistic
 browser headers with User-Agent rotation.
+
+Traffic can optionally leave through a pool of egress proxies, configured
+with WEBOX_PROXIES (comma-separated proxy URLs). Set WEBOX_PROXY_STICKY=1 to
+pin each target host to the same healthy proxy.
 """
 
+import hashlib
+import os
 import random
+import statistics
+import threading
+import time
+import urllib.parse
+from collections import deque
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
 
 try:
-    from curl_cffi import requests
+    from curl_cffi import CurlECode, CurlInfo, requests
+    from curl_cffi.requests.exceptions import ConnectTimeout, ProxyError
 except Exception as exc:  # pragma: no cover
     raise ImportError(
         "Missing dependency: curl_cffi. Install with: pip install curl_cffi"
@@ -42,6 +54,7 @@ class StealthResponse:
     content_encoding: str = ""
     redirect_chain: List[str] = field(default_factory=list)
     redirect_statuses: List[int] = field(default_factory=list)
+    egress: str = "direct"
 
 
 USER_AGENTS = {
@@ -172,11 +185,204 @@ def _randomize_header_order(headers: Dict[str, str]) -> Dict[str, str]:
     return dict(items)
 
 
-def stealth_get(
+# curl reads a zero timeout as "no timeout", so never hand it less than this.
+MIN_REQUEST_TIMEOUT = 0.01
+
+# Gateway errors a proxy returns itself when it cannot reach the origin.
+_PROXY_GATEWAY_STATUSES = {502, 504}
+
+
+def _is_proxy_failure(url: str, status_code: int) -> bool:
+    # Origin responses such as 403, 429 or 503 say nothing about the proxy,
+    # so only proxy-level failures count against it. Over HTTPS a failed
+    # CONNECT surfaces as an exception; over plain HTTP the proxy answers
+    # with its own gateway error.
+    if status_code == 407:
+        return True
+    return (
+        status_code in _PROXY_GATEWAY_STATUSES
+        and urllib.parse.urlsplit(url).scheme == "http"
+    )
+
+
+# Through a proxy curl only connects to the proxy itself, so these codes
+# mean the proxy was unreachable. Timeouts, TLS and DNS errors are usually
+# the origin's doing and are left out of proxy health.
+_PROXY_CONNECT_CODES = {CurlECode.COULDNT_CONNECT, CurlECode.COULDNT_RESOLVE_PROXY}
+
+
+def _is_proxy_exception(exc: Exception) -> bool:
+    if isinstance(exc, (ProxyError, ConnectTimeout)):
+        return True
+    return getattr(exc, "code", None) in _PROXY_CONNECT_CODES
+
+
+def _redact_proxy(proxy_url: str) -> str:
+    parts = urllib.parse.urlsplit(proxy_url)
+    host = parts.hostname or ""
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return f"{parts.scheme}://{host}" if parts.scheme else host
+
+
+@dataclass
+class _ProxyState:
+    url: str
+    label: str
+    # Recent (ok, time to first byte) outcomes; latency is None on failure.
+    outcomes: Deque[Tuple[bool, Optional[float]]] = field(default_factory=deque)
+    benched_until: float = 0.0
+    idle_sessions: Dict[str, List[requests.Session]] = field(default_factory=dict)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    def latency(self) -> Optional[float]:
+        samples = [latency for ok, latency in self.outcomes if ok and latency is not None]
+        return statistics.median(samples) if samples else None
+
+    def score(self) -> float:
+        latency = self.latency()
+        if latency is None:
+            latency = 1.0
+        return 1.0 / (max(latency, 0.05) * (1.0 + 4.0 * self.error_rate()))
+
+
+class ProxyPool:
+    """Egress proxies with per-proxy session reuse and health scoring.
+
+    Each proxy keeps idle curl_cffi sessions per TLS fingerprint so
+    connections are reused without mixing fingerprints. Health is judged on
+    a window of recent requests: the error rate of proxy-level failures and
+    the median time to first byte. A proxy that crosses either threshold
+    once the window holds ``min_samples`` outcomes is benched for
+    ``bench_seconds``.
+    """
+
+    def __init__(
+        self,
+        proxies: Sequence[str],
+        sticky: bool = False,
+        max_idle_sessions: int = 4,
+        error_threshold: float = 0.5,
+        latency_threshold: float = 15.0,
+        window: int = 20,
+        min_samples: int = 10,
+        bench_seconds: float = 60.0,
+    ) -> None:
+        if not proxies:
+            raise ValueError("ProxyPool requires at least one proxy URL")
+        self._states = [
+            _ProxyState(url=p, label=_redact_proxy(p), outcomes=deque(maxlen=window))
+            for p in proxies
+        ]
+        self.sticky = sticky
+        self.max_idle_sessions = max_idle_sessions
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.min_samples = min_samples
+        self.bench_seconds = bench_seconds
+        self._lock = threading.Lock()
+
+    def choose(self, host: str) -> _ProxyState:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [s for s in self._states if s.benched_until <= now]
+            if not healthy:
+                # Everything is benched; use the proxy that comes back first.
+                return min(self._states, key=lambda s: s.benched_until)
+            if self.sticky and host:
+                # Rendezvous hashing keeps a host on one proxy while it stays
+                # healthy and only moves that host's traffic when it is benched.
+                return max(
+                    healthy,
+                    key=lambda s: hashlib.blake2b(
+                        f"{s.url}|{host}".encode("utf-8"), digest_size=8
+                    ).digest(),
+                )
+            weights = [s.score() for s in healthy]
+            return random.choices(healthy, weights=weights, k=1)[0]
+
+    def acquire_session(self, state: _ProxyState, fingerprint: str) -> requests.Session:
+        with self._lock:
+            idle = state.idle_sessions.get(fingerprint)
+            if idle:
+                return idle.pop()
+        return requests.Session(
+            proxies={"http": state.url, "https": state.url},
+            curl_infos=[CurlInfo.STARTTRANSFER_TIME],
+        )
+
+    def release_session(
+        self, state: _ProxyState, fingerprint: str, session: requests.Session
+    ) -> None:
+        # Connections are reused across requests, cookies are not.
+        session.cookies.clear()
+        with self._lock:
+            idle = state.idle_sessions.setdefault(fingerprint, [])
+            if state.benched_until <= time.monotonic() and len(idle) < self.max_idle_sessions:
+                idle.append(session)
+                return
+        session.close()
+
+    def record(self, state: _ProxyState, ok: bool, latency: Optional[float] = None) -> None:
+        stale: List[requests.Session] = []
+        with self._lock:
+            state.outcomes.append((ok, latency if ok else None))
+            if len(state.outcomes) < self.min_samples:
+                return
+            median_latency = state.latency()
+            unhealthy = state.error_rate() >= self.error_threshold or (
+                median_latency is not None and median_latency >= self.latency_threshold
+            )
+            if unhealthy:
+                state.benched_until = time.monotonic() + self.bench_seconds
+                # Come back from the bench with a clean slate.
+                state.outcomes.clear()
+                for sessions in state.idle_sessions.values():
+                    stale.extend(sessions)
+                state.idle_sessions.clear()
+        for session in stale:
+            session.close()
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = [x for s in self._states for v in s.idle_sessions.values() for x in v]
+            for s in self._states:
+                s.idle_sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_default_pool: Optional[ProxyPool] = None
+_default_pool_loaded = False
+_default_pool_lock = threading.Lock()
+
+
+def get_default_proxy_pool() -> Optional[ProxyPool]:
+    global _default_pool, _default_pool_loaded
+    with _default_pool_lock:
+        if not _default_pool_loaded:
+            proxies = [
+                p.strip() for p in os.environ.get("WEBOX_PROXIES", "").split(",") if p.strip()
+            ]
+            sticky = os.environ.get("WEBOX_PROXY_STICKY", "").lower() in {"1", "true", "yes"}
+            _default_pool = ProxyPool(proxies, sticky=sticky) if proxies else None
+            _default_pool_loaded = True
+        return _default_pool
+
+
+def _stealth_request(
+    method: str,
     url: str,
-    timeout: float = 30.0,
-    follow_redirects: bool = True,
-    extra_headers: Optional[Dict[str, str]] = None,
+    timeout: float,
+    follow_redirects: bool,
+    extra_headers: Optional[Dict[str, str]],
+    proxy_pool: Optional[ProxyPool],
+    headers_only: bool = False,
+    record_health: bool = True,
 ) -> StealthResponse:
     browser_type, user_agent = _select_browser()
     headers = _headers_for_browser(browser_type, user_agent)
@@ -186,14 +392,46 @@ def stealth_get(
 
     fingerprint = TLS_FINGERPRINTS.get(browser_type, "chrome120")
 
-    with requests.Session() as session:
-        response = session.get(
+    def send(session: requests.Session):
+        response = session.request(
+            method,
             url,
             headers=headers,
             timeout=timeout,
             allow_redirects=follow_redirects,
             impersonate=fingerprint,
+            stream=headers_only,
         )
+        if headers_only:
+            # Drop the transfer as soon as the headers are in.
+            response.close()
+        return response
+
+    pool = proxy_pool or get_default_proxy_pool()
+    egress = "direct"
+    if pool is None:
+        with requests.Session() as session:
+            response = send(session)
+    else:
+        state = pool.choose(urllib.parse.urlsplit(url).hostname or "")
+        egress = state.label
+        session = pool.acquire_session(state, fingerprint)
+        try:
+            response = send(session)
+        except Exception as exc:
+            if record_health and _is_proxy_exception(exc):
+                pool.record(state, ok=False)
+            session.close()
+            raise
+        if record_health:
+            # Time to first byte, so large bodies do not count as proxy latency.
+            latency = response.infos.get(CurlInfo.STARTTRANSFER_TIME)
+            pool.record(
+                state,
+                ok=not _is_proxy_failure(url, response.status_code),
+                latency=float(latency) if latency is not None else None,
+            )
+        pool.release_session(state, fingerprint, session)
 
     history = getattr(response, "history", []) or []
     redirect_chain = [str(item.url) for item in history if getattr(item, "url", None)]
@@ -203,13 +441,70 @@ def stealth_get(
 
     return StealthResponse(
         status_code=response.status_code,
-        text=response.text,
+        text="" if headers_only else response.text,
         headers=dict(response.headers),
         url=str(response.url),
         browser_used=browser_type.value,
         tls_fingerprint=fingerprint,
-        content=response.content,
+        content=b"" if headers_only else response.content,
         content_encoding=response.headers.get("content-encoding", ""),
         redirect_chain=redirect_chain,
         redirect_statuses=redirect_statuses,
+        egress=egress,
+    )
+
+
+def stealth_get(
+    url: str,
+    timeout: float = 30.0,
+    follow_redirects: bool = True,
+    extra_headers: Optional[Dict[str, str]] = None,
+    proxy_pool: Optional[ProxyPool] = None,
+) -> StealthResponse:
+    return _stealth_request(
+        "GET", url, timeout, follow_redirects, extra_headers, proxy_pool
+    )
+
+
+def stealth_probe(
+    url: str,
+    timeout: float = 10.0,
+    extra_headers: Optional[Dict[str, str]] = None,
+    proxy_pool: Optional[ProxyPool] = None,
+) -> StealthResponse:
+    """Fetch only response headers for ``url``, without downloading the body.
+
+    Tries HEAD first and falls back to a one-byte ranged GET when the server
+    rejects HEAD or omits the content type. Both requests share ``timeout``.
+    Body fields are always empty. Probe outcomes are not recorded against
+    proxy health, since many CDNs refuse HEAD outright.
+    """
+    expires_at = time.monotonic() + timeout
+    resp = _stealth_request(
+        "HEAD",
+        url,
+        timeout,
+        True,
+        extra_headers,
+        proxy_pool,
+        headers_only=True,
+        record_health=False,
+    )
+    has_type = any(k.lower() == "content-type" for k in resp.headers)
+    if resp.status_code < 400 and has_type:
+        return resp
+    remaining = expires_at - time.monotonic()
+    if remaining < MIN_REQUEST_TIMEOUT:
+        return resp
+    ranged = dict(extra_headers or {})
+    ranged["Range"] = "bytes=0-0"
+    return _stealth_request(
+        "GET",
+        url,
+        remaining,
+        True,
+        ranged,
+        proxy_pool,
+        headers_only=True,
+        record_health=False,
     )